@@ -2,7 +2,10 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import time
+import tempfile
+import numpy as np
 import dropbox  # Import the dropbox SDK
+from openpyxl import Workbook
 
 # --- App Configuration ---
 st.set_page_config(layout="wide", page_title="RKSC DURGA PUJA 2K25")
@@ -61,6 +64,17 @@ ZONE_BILL_RANGES = {
     "BILL no. 18- (976-1000)": (976, 1000)
 }
 
+# --- View & Export Settings ---
+PAGE_SIZE = 50  # Rows shown per page in transaction views
+EXPORT_CHUNK_SIZE = 500  # Rows written per chunk when building reports
+EXPORT_SPOOL_SIZE = 5 * 1024 * 1024  # Reports larger than this spill to an unnamed temp file
+LEDGERS = {  # Ledger name -> (sort column, ascending, date column)
+    "Credit Log": ("Bill No", True, "Date"),
+    "Due List": ("Bill No", True, None),
+    "Due Collection History": ("Payment Date", False, "Payment Date"),
+    "Debit Log": ("Date", False, "Date"),
+}
+
 # --- Passwords ---
 STARTUP_PASSWORD = "start"
 ADMIN_PASSWORD = "puja2025"
@@ -140,10 +154,9 @@ def initialize_dropbox_files(dbx):
 
 
 # --- Data Loading ---
-@st.cache_data(ttl=60)
-def load_credit_data(_dbx):
-    """Loads credit log data from Dropbox."""
-    content = read_file_from_dropbox(_dbx, DROPBOX_CREDIT_LOG_PATH)
+def read_credit_data(dbx):
+    """Reads and parses the credit log from Dropbox."""
+    content = read_file_from_dropbox(dbx, DROPBOX_CREDIT_LOG_PATH)
     if content:
         df = pd.read_csv(pd.io.common.StringIO(content))
         if 'Due Payment Date' not in df.columns:
@@ -154,9 +167,13 @@ def load_credit_data(_dbx):
     return pd.DataFrame(columns=["Zone", "Bill No", "Name", "Address", "Amount on Billbook", "Actual Amount Received", "Date", "Due Payment Date", "Partial Due Payment Date"])
 
 @st.cache_data(ttl=60)
-def load_due_data(_dbx):
-    """Loads due list data from Dropbox."""
-    content = read_file_from_dropbox(_dbx, DROPBOX_DUE_LIST_PATH)
+def load_credit_data(_dbx):
+    """Loads credit log data from Dropbox."""
+    return read_credit_data(_dbx)
+
+def read_due_data(dbx):
+    """Reads and parses the due list from Dropbox."""
+    content = read_file_from_dropbox(dbx, DROPBOX_DUE_LIST_PATH)
     if content:
         df = pd.read_csv(pd.io.common.StringIO(content))
         if 'Address' not in df.columns: # For backward compatibility
@@ -165,11 +182,15 @@ def load_due_data(_dbx):
     return pd.DataFrame(columns=["Zone", "Bill No", "Name", "Address", "Due Amount"])
 
 @st.cache_data(ttl=60)
-def load_debit_data(_dbx):
-    """Loads debit log data from Dropbox."""
+def load_due_data(_dbx):
+    """Loads due list data from Dropbox."""
+    return read_due_data(_dbx)
+
+def read_debit_data(dbx):
+    """Reads and parses the debit log from Dropbox."""
     total_debit = 0
     debit_entries = []
-    content = read_file_from_dropbox(_dbx, DROPBOX_DEBIT_LOG_PATH)
+    content = read_file_from_dropbox(dbx, DROPBOX_DEBIT_LOG_PATH)
     if content:
         for line in content.splitlines():
             parts = line.strip().split('|')
@@ -184,13 +205,22 @@ def load_debit_data(_dbx):
     return debit_entries, total_debit
 
 @st.cache_data(ttl=60)
-def load_due_collection_data(_dbx):
-    """Loads due collection log data from Dropbox."""
-    content = read_file_from_dropbox(_dbx, DROPBOX_DUE_COLLECTION_PATH)
+def load_debit_data(_dbx):
+    """Loads debit log data from Dropbox."""
+    return read_debit_data(_dbx)
+
+def read_due_collection_data(dbx):
+    """Reads and parses the due collection log from Dropbox."""
+    content = read_file_from_dropbox(dbx, DROPBOX_DUE_COLLECTION_PATH)
     if content:
         return pd.read_csv(pd.io.common.StringIO(content))
     return pd.DataFrame(columns=["Zone", "Bill No", "Name", "Address", "Amount on Billbook", "Total Amount Received", "Amount Paid Now", "Remaining Due", "Payment Date", "Status"])
 
+@st.cache_data(ttl=60)
+def load_due_collection_data(_dbx):
+    """Loads due collection log data from Dropbox."""
+    return read_due_collection_data(_dbx)
+
 # --- Utility Functions ---
 
 def get_next_bill_no(zone, current_credit_df):
@@ -205,6 +235,84 @@ def get_next_bill_no(zone, current_credit_df):
             return i
     return None
 
+def build_zone_index(df, sort_by, ascending=True):
+    """Sorts a ledger once and maps each zone to its row positions in that order.
+
+    The key None holds every row, so ledgers without a Zone column (debits) work too.
+    """
+    sorted_df = df.sort_values(by=sort_by, ascending=ascending, kind="mergesort").reset_index(drop=True)
+    zone_index = {None: np.arange(len(sorted_df))}
+    if "Zone" in sorted_df.columns:
+        zone_index.update(sorted_df.groupby("Zone").indices)
+    return sorted_df, zone_index
+
+@st.cache_resource(ttl=60)
+def load_ledger_index(_dbx, ledger):
+    """Loads a ledger and builds its sorted zone index once per data refresh.
+
+    Reads Dropbox directly rather than through the load_* caches, so views are at
+    most one TTL stale. The result is shared read-only by the paginated views and
+    exports; the editing forms keep using their own copies from load_*_data.
+    """
+    if ledger == "Credit Log":
+        df = read_credit_data(_dbx)
+    elif ledger == "Due List":
+        df = read_due_data(_dbx)
+    elif ledger == "Due Collection History":
+        df = read_due_collection_data(_dbx)
+    else:
+        df = pd.DataFrame(read_debit_data(_dbx)[0], columns=["Date", "Amount", "Purpose"])
+    sort_by, ascending, _ = LEDGERS[ledger]
+    return build_zone_index(df, sort_by, ascending=ascending)
+
+def view_toggle(label, key):
+    """Show/Hide button that keeps its view open across reruns (e.g. while changing pages)."""
+    visible_key = f"{key}_visible"
+    visible = st.session_state.get(visible_key, False)
+    st.button(
+        label.replace("Show", "Hide", 1) if visible else label, key=key,
+        on_click=lambda: st.session_state.update({visible_key: not visible})
+    )
+    return visible
+
+def show_paginated(df, positions, key, empty_text):
+    """Displays only the requested page of rows from a pre-sorted ledger."""
+    total_rows = len(positions)
+    if total_rows == 0:
+        st.info(empty_text)
+        return
+    total_pages = (total_rows - 1) // PAGE_SIZE + 1
+    page = 1
+    if total_pages > 1:
+        if st.session_state.get(f"{key}_page", 1) > total_pages:  # Ledger shrank since last view
+            st.session_state[f"{key}_page"] = total_pages
+        page = st.number_input(f"Page (1-{total_pages})", min_value=1, max_value=total_pages, step=1, key=f"{key}_page")
+    start = (int(page) - 1) * PAGE_SIZE
+    end = min(start + PAGE_SIZE, total_rows)
+    st.dataframe(df.iloc[positions[start:end]], use_container_width=True)
+    st.caption(f"Showing rows {start + 1}-{end} of {total_rows}")
+
+def iter_report_chunks(df, positions, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields slices of a ledger in report order, one chunk at a time."""
+    for start in range(0, len(positions), chunk_size):
+        yield df.iloc[positions[start:start + chunk_size]]
+
+def export_report(df, positions, file_format, report_file):
+    """Writes the selected ledger rows chunk by chunk into a binary CSV or Excel file."""
+    if file_format == "Excel":
+        workbook = Workbook(write_only=True)  # Streams rows to disk instead of keeping the sheet in memory
+        sheet = workbook.create_sheet("Report")
+        sheet.append(list(df.columns))
+        for chunk in iter_report_chunks(df, positions):
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                sheet.append(row)
+        workbook.save(report_file)
+    else:
+        report_file.write(df.head(0).to_csv(index=False).encode('utf-8'))
+        for chunk in iter_report_chunks(df, positions):
+            report_file.write(chunk.to_csv(index=False, header=False).encode('utf-8'))
+
 def display_message(type, text, duration=2):
     """Displays a Streamlit message and clears it after a duration."""
     placeholder = st.empty()
@@ -222,6 +330,7 @@ def display_message(type, text, duration=2):
     load_debit_data.clear()
     load_due_data.clear()
     load_due_collection_data.clear()
+    load_ledger_index.clear()
 
     time.sleep(duration)
     placeholder.empty()
@@ -263,14 +372,10 @@ def main():
 
     if mode == "User":
         st.title("👥 User Section")
-        credit_df = load_credit_data(dbx)
         user_zone = st.selectbox("Select Zone to View Transactions", ZONES, key="user_zone_select")
-        if st.button("Show Zone Transactions", key="show_user_tx_btn"):
-            user_data = credit_df[credit_df["Zone"] == user_zone]
-            if not user_data.empty:
-                st.dataframe(user_data.sort_values(by="Bill No"), use_container_width=True)
-            else:
-                st.info("No transactions yet for this zone.")
+        if view_toggle("Show Zone Transactions", key="show_user_tx_btn"):
+            sorted_credit_df, credit_index = load_ledger_index(dbx, "Credit Log")
+            show_paginated(sorted_credit_df, credit_index.get(user_zone, []), f"user_tx_{user_zone}", "No transactions yet for this zone.")
 
 
     elif mode == "Admin":
@@ -292,9 +397,9 @@ def main():
         st.title("🛠 Admin Panel")
         st.header(f"Operating in: {selected_zone.upper()}")
 
-        credit_tab, update_tab, due_tab, debit_tab, summary_tab, date_tab, bill_info_tab = st.tabs([
+        credit_tab, update_tab, due_tab, debit_tab, summary_tab, date_tab, bill_info_tab, export_tab = st.tabs([
             "Credit & View Transactions", "Update Transaction", "Due Management",
-            "Debit Entry", "Summary", "Amount Per Date", "Bill Book Info"
+            "Debit Entry", "Summary", "Amount Per Date", "Bill Book Info", "Export Reports"
         ])
 
         with credit_tab:
@@ -346,12 +451,9 @@ def main():
                         display_message('success', msg)
 
             st.subheader("📋 Show Transactions")
-            if st.button("Show Transactions for Zone", key="show_admin_tx_btn"):
-                zone_data = credit_df[credit_df["Zone"] == selected_zone]
-                if not zone_data.empty:
-                    st.dataframe(zone_data.sort_values(by="Bill No"), use_container_width=True)
-                else:
-                    st.info("No transactions yet for this zone.")
+            if view_toggle("Show Transactions for Zone", key="show_admin_tx_btn"):
+                sorted_credit_df, credit_index = load_ledger_index(dbx, "Credit Log")
+                show_paginated(sorted_credit_df, credit_index.get(selected_zone, []), f"admin_tx_{selected_zone}", "No transactions yet for this zone.")
 
         with due_tab:
             st.header("Due Management")
@@ -445,21 +547,18 @@ def main():
 
             st.subheader("📄 Due Lists")
             show_dues, show_due_collections = st.columns(2)
-            if show_dues.button("Show Current Due List", key="show_due_list_btn"):
-                due_df_display = load_due_data(dbx)
-                filtered_dues = due_df_display[due_df_display["Zone"] == selected_zone]
-                if not filtered_dues.empty:
-                    st.dataframe(filtered_dues.sort_values(by="Bill No"), use_container_width=True)
-                else:
-                    st.info("No current dues for this zone.")
+            with show_dues:
+                due_list_visible = view_toggle("Show Current Due List", key="show_due_list_btn")
+            with show_due_collections:
+                due_collection_visible = view_toggle("Show Due Collection History", key="show_due_collection_btn")
 
-            if show_due_collections.button("Show Due Collection History", key="show_due_collection_btn"):
-                due_collection_df = load_due_collection_data(dbx)
-                filtered_collections = due_collection_df[due_collection_df["Zone"] == selected_zone]
-                if not filtered_collections.empty:
-                    st.dataframe(filtered_collections.sort_values(by="Payment Date", ascending=False), use_container_width=True)
-                else:
-                    st.info("No collection history yet for this zone.")
+            if due_list_visible:
+                sorted_due_df, due_index = load_ledger_index(dbx, "Due List")
+                show_paginated(sorted_due_df, due_index.get(selected_zone, []), f"due_list_{selected_zone}", "No current dues for this zone.")
+
+            if due_collection_visible:
+                sorted_collection_df, collection_index = load_ledger_index(dbx, "Due Collection History")
+                show_paginated(sorted_collection_df, collection_index.get(selected_zone, []), f"due_collection_{selected_zone}", "No collection history yet for this zone.")
 
         with update_tab:
             st.header("Update Transaction")
@@ -586,13 +685,9 @@ def main():
             
             st.markdown("---")
             st.subheader("Show All Debits")
-            if st.button("Show All Debit Transactions"):
-                all_debits, _ = load_debit_data(dbx)
-                if all_debits:
-                    debit_df = pd.DataFrame(all_debits)
-                    st.dataframe(debit_df.sort_values(by="Date", ascending=False), use_container_width=True)
-                else:
-                    st.info("No debit transactions have been recorded yet.")
+            if view_toggle("Show All Debit Transactions", key="show_debit_tx_btn"):
+                sorted_debit_df, debit_index = load_ledger_index(dbx, "Debit Log")
+                show_paginated(sorted_debit_df, debit_index[None], "debit_tx", "No debit transactions have been recorded yet.")
 
 
         with summary_tab:
@@ -668,5 +763,60 @@ def main():
                 else:
                     st.info(f"Bill No {search_bill_no} has not been issued yet.")
 
+        with export_tab:
+            st.header("Export Reports")
+            export_ledger = st.selectbox("Ledger", list(LEDGERS), key="export_ledger_select")
+            date_column = LEDGERS[export_ledger][2]
+            has_zones = export_ledger != "Debit Log"
+            scopes = ["Full Season"]
+            if has_zones:
+                scopes.append("Zone")
+            if date_column:
+                scopes.append("Single Date (all zones)" if has_zones else "Single Date")
+                if has_zones:
+                    scopes.append("Single Date (zone)")
+            export_scope = st.radio(
+                "Report Scope", scopes, horizontal=True, key="export_scope_select",
+                format_func=lambda scope: scope.replace("Zone", f"Zone: {selected_zone}").replace("(zone)", f"({selected_zone})")
+            )
+            export_date_str = None
+            if export_scope.startswith("Single Date"):
+                export_date_str = st.date_input("Report Date", value=datetime.today(), key="export_date_select").strftime("%Y-%m-%d")
+            export_format = st.radio("Format", ["CSV", "Excel"], horizontal=True, key="export_format_select")
+
+            if st.button("Generate Report", key="generate_report_btn"):
+                sorted_ledger_df, ledger_index = load_ledger_index(dbx, export_ledger)
+                no_rows = np.array([], dtype=np.intp)
+
+                if export_scope == "Full Season":
+                    if has_zones:
+                        # Keep zones in bill book order rather than alphabetical order.
+                        zone_order = ZONES + sorted(z for z in ledger_index if z is not None and z not in ZONES)
+                        report_positions = np.concatenate([ledger_index.get(zone, no_rows) for zone in zone_order])
+                        # Rows without a zone are not in any zone group; add them last so none are dropped.
+                        report_positions = np.concatenate([report_positions, np.setdiff1d(ledger_index[None], report_positions)])
+                    else:
+                        report_positions = ledger_index[None]
+                    scope_label = "full_season"
+                elif export_scope == "Zone":
+                    report_positions = ledger_index.get(selected_zone, no_rows)
+                    scope_label = selected_zone
+                else:
+                    zone_scoped = export_scope == "Single Date (zone)"
+                    report_positions = ledger_index.get(selected_zone, no_rows) if zone_scoped else ledger_index[None]
+                    date_matches = (sorted_ledger_df[date_column] == export_date_str).to_numpy()
+                    report_positions = report_positions[date_matches[report_positions]]
+                    scope_label = f"{selected_zone}_{export_date_str}" if zone_scoped else export_date_str
+
+                file_ext, mime = ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet") if export_format == "Excel" else ("csv", "text/csv")
+                file_name = f"{export_ledger}_{scope_label}".lower().replace(" ", "_") + f".{file_ext}"
+                # Built once per click; nothing is kept in session state or left on disk afterwards.
+                with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as report_file:
+                    export_report(sorted_ledger_df, report_positions, export_format, report_file)
+                    report_file.seek(0)
+                    report_data = report_file.read()
+                st.info(f"{file_name} is ready ({len(report_positions)} rows). Generate it again after changing any option.")
+                st.download_button("⬇️ Download Report", data=report_data, file_name=file_name, mime=mime, key="download_report_btn")
+
 if __name__ == "__main__":
     main()